@@ -1,10 +1,14 @@
 import os
+import asyncio
 import logging
-import sqlite3
 import io
 import re
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
-from ics import Calendar
+import aiosqlite
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -15,7 +19,7 @@ from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
 )
-from openai import OpenAI
+from openai import AsyncOpenAI
 import scheduler2  # For finding free slots
 import update_schedule_2  # For updating ICS files
 
@@ -23,19 +27,101 @@ import update_schedule_2  # For updating ICS files
 load_dotenv()
 # Set your OpenAI API key from the .env file
 
+# SQLite database settings. WAL lets the pooled readers run while the single writer commits.
+DB_PATH = 'meetings.db'
+DB_READ_POOL_SIZE = 4
+DB_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+"""
+
+async def open_connection(read_only=False):
+    if read_only:
+        connection = await aiosqlite.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    else:
+        connection = await aiosqlite.connect(DB_PATH)
+    await connection.executescript(DB_PRAGMAS)
+    return connection
+
+# Small connection pool: one read-write connection plus a few read-only ones.
+# Connections are opened in the application's post_init hook, see init_database.
+class ConnectionPool:
+    def __init__(self, size):
+        self._size = size
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+
+    async def open(self):
+        # The writer goes first: it creates the database file and switches it to WAL,
+        # which the read-only connections cannot do themselves.
+        self._writer = await open_connection()
+        for _ in range(self._size):
+            self._readers.put_nowait(await open_connection(read_only=True))
+
+    async def close(self):
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def read(self):
+        connection = await self._readers.get()
+        try:
+            async with connection.cursor() as cursor:
+                yield cursor
+        finally:
+            self._readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._writer_lock:
+            try:
+                async with self._writer.cursor() as cursor:
+                    yield cursor
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+pool = ConnectionPool(DB_READ_POOL_SIZE)
+
 # Initialize SQLite database 
-conn = sqlite3.connect('meetings.db', check_same_thread=False)
-c = conn.cursor()
-c.execute('''CREATE TABLE IF NOT EXISTS meetings
-             (meeting_id TEXT PRIMARY KEY,
-              user_a_schedule TEXT,
-              user_b_schedule TEXT,
-              user_a_id TEXT,
-              user_b_id TEXT,
-              meeting_duration INTEGER)''')
-c.execute('''CREATE TABLE IF NOT EXISTS user_choices
-             (meeting_id TEXT, user_id TEXT, choices TEXT)''')
-conn.commit()
+async def init_database(application):
+    await pool.open()
+    async with pool.write() as c:
+        await c.execute('''CREATE TABLE IF NOT EXISTS meetings
+                           (meeting_id TEXT PRIMARY KEY,
+                            user_a_schedule TEXT,
+                            user_b_schedule TEXT,
+                            user_a_id TEXT,
+                            user_b_id TEXT,
+                            meeting_duration INTEGER)''')
+        # One row per selected slot. The slot string is stored rather than its position in the
+        # in-memory slot list, since that list can be recomputed differently between submissions.
+        await c.execute('''CREATE TABLE IF NOT EXISTS meeting_choices
+                           (meeting_id TEXT, user_id TEXT, slot TEXT,
+                            PRIMARY KEY (meeting_id, user_id, slot))''')
+        # Parsed event lists are stored next to the raw ICS so schedules are only parsed once.
+        await c.execute("PRAGMA table_info(meetings)")
+        existing_columns = {row[1] for row in await c.fetchall()}
+        for column in ("user_a_parsed", "user_b_parsed"):
+            if column not in existing_columns:
+                await c.execute(f"ALTER TABLE meetings ADD COLUMN {column} BLOB")
+
+async def close_resources(application):
+    await pool.close()
+    executor.shutdown()
+
+# Worker processes for CPU-bound ICS parsing and slot searches, so they don't stall the event loop.
+# Workers come from a forkserver rather than fork(), since by the time they start this process is
+# already running aiosqlite and executor threads.
+executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("forkserver"))
 
 # Bot token from .env or fallback
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
@@ -44,10 +130,70 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Helper function to compute the common free slots for a meeting, reusing the meeting's cached
+# slots when neither calendar, the duration nor the day changed. Results are not shared between
+# meetings: the search trims today's slots at the current time, so another meeting's list may
+# already contain times that have passed. Persisted parses are preferred; the raw ICS is only
+# read for rows stored before parses were persisted.
+async def common_slots_for_meeting(context, meeting_id, meeting_duration):
+    async with pool.read() as cur:
+        await cur.execute("SELECT user_a_parsed, user_b_parsed FROM meetings WHERE meeting_id=?", (meeting_id,))
+        parsed_blobs = await cur.fetchone()
+        schedules = (None, None)
+        if None in parsed_blobs:
+            await cur.execute("SELECT user_a_schedule, user_b_schedule FROM meetings WHERE meeting_id=?", (meeting_id,))
+            schedules = await cur.fetchone()
+    calendars = [blob if blob is not None else schedule for schedule, blob in zip(schedules, parsed_blobs)]
+    sig = tuple(
+        hashlib.blake2b(cal if isinstance(cal, bytes) else cal.encode(), digest_size=16).digest()
+        for cal in calendars
+    ) + (meeting_duration, datetime.now().astimezone().date())
+
+    cached = context.bot_data.get(meeting_id)
+    if cached and cached["sig"] == sig:
+        return cached["slots"]
+    # The stored blobs (or raw ICS) go to the worker as-is; loading or parsing happens there.
+    common_slots = await asyncio.get_running_loop().run_in_executor(
+        executor, scheduler2.find_best_meeting_slots_for_stored, calendars, meeting_duration
+    )
+    # Keep a set and a position index next to the list so button presses never scan it.
+    entry = {
+        "sig": sig,
+        "slots": common_slots,
+        "set": frozenset(common_slots),
+        "index": {slot: i for i, slot in enumerate(common_slots)},
+    }
+    # Cache the computed common slots for this meeting along with the inputs they came from.
+    context.bot_data[meeting_id] = entry
+    return entry["slots"]
+
+# Helper function to retrieve the cached slot entry for a meeting (or recalc if missing).
+# Schedules cannot be replaced once both are stored, so an existing entry is trusted
+# without re-reading the calendars. Returns None if the meeting does not exist.
+async def cached_slots_entry(context, meeting_id):
+    cached = context.bot_data.get(meeting_id)
+    if not cached or not cached["slots"]:
+        async with pool.read() as cur:
+            await cur.execute("SELECT meeting_duration FROM meetings WHERE meeting_id=?", (meeting_id,))
+            row = await cur.fetchone()
+        if not row:
+            return None
+        meeting_duration = row[0]
+        if not meeting_duration:
+            meeting_duration = 30
+        await common_slots_for_meeting(context, meeting_id, meeting_duration)
+        cached = context.bot_data[meeting_id]
+    return cached
+
+# Helper function to build the inline button for a single free slot.
+def slot_button(meeting_id, slot, selected):
+    return InlineKeyboardButton(f"{'✅ ' if selected else ''}{slot}", callback_data=f"{meeting_id}|{slot}")
+
 # Helper function to validate meeting IDs (format: xxx xxx xxx xxx)
+MEETING_ID_PATTERN = re.compile(r"^\d{3}( \d{3}){3}$")
+
 def valid_meeting_id(meeting_id: str) -> bool:
-    pattern = r"^\d{3}( \d{3}){3}$"
-    return re.match(pattern, meeting_id) is not None
+    return MEETING_ID_PATTERN.match(meeting_id) is not None
 
 # /newmeeting command handler: Clears any previous state and asks for a meeting ID.
 async def start_new_meeting(update: Update, context: CallbackContext):
@@ -66,8 +212,10 @@ async def store_meeting_id(update: Update, context: CallbackContext):
         return
 
     # Check if the meeting ID already exists.
-    c.execute("SELECT meeting_id FROM meetings WHERE meeting_id=?", (meeting_id,))
-    if c.fetchone() is not None:
+    async with pool.read() as cur:
+        await cur.execute("SELECT meeting_id FROM meetings WHERE meeting_id=?", (meeting_id,))
+        existing = await cur.fetchone()
+    if existing is not None:
         await update.message.reply_text(
             "Meeting ID already exists. Please enter a different meeting ID."
         )
@@ -75,8 +223,16 @@ async def store_meeting_id(update: Update, context: CallbackContext):
 
     user_id = update.message.from_user.id
     # Insert the meeting with user_a_id (the meeting creator)
-    c.execute("INSERT OR IGNORE INTO meetings (meeting_id, user_a_id) VALUES (?, ?)", (meeting_id, user_id))
-    conn.commit()
+    async with pool.write() as cur:
+        await cur.execute("INSERT OR IGNORE INTO meetings (meeting_id, user_a_id) VALUES (?, ?)", (meeting_id, user_id))
+        inserted = cur.rowcount > 0
+    # Someone else may have created the same meeting since the check above.
+    if not inserted:
+        await update.message.reply_text(
+            "Meeting ID already exists. Please enter a different meeting ID."
+        )
+        return
+    context.bot_data.setdefault("roles", {})[(meeting_id, user_id)] = "a"
 
     # Store the meeting id and signal that we are now waiting for the meeting duration.
     context.user_data['current_meeting'] = meeting_id
@@ -106,8 +262,8 @@ async def store_meeting_duration(update: Update, context: CallbackContext):
         return
 
     # Update the meeting record with the meeting duration.
-    c.execute("UPDATE meetings SET meeting_duration=? WHERE meeting_id=?", (duration, meeting_id))
-    conn.commit()
+    async with pool.write() as cur:
+        await cur.execute("UPDATE meetings SET meeting_duration=? WHERE meeting_id=?", (duration, meeting_id))
     # Remove the awaiting_duration flag.
     context.user_data.pop("awaiting_duration", None)
 
@@ -136,63 +292,80 @@ async def handle_ics_upload(update: Update, context: CallbackContext):
         return
 
     ics_file = await update.message.document.get_file()
-    ics_content_bytes = await ics_file.download_as_bytearray()
-    calendar_content = ics_content_bytes.decode()
+    # Download straight into a buffer and decode from its memory view, avoiding an extra bytes copy.
+    ics_buffer = io.BytesIO()
+    await ics_file.download_to_memory(ics_buffer)
+    calendar_content = str(ics_buffer.getbuffer(), "utf-8")
+
+    # Which participant ("a" or "b") the uploader is. Recorded when the meeting is created or
+    # joined; only looked up in the database if the bot restarted since then.
+    roles = context.bot_data.setdefault("roles", {})
+    role = roles.get((meeting_id, user_id))
+    if role is None:
+        async with pool.read() as cur:
+            await cur.execute("SELECT user_a_id FROM meetings WHERE meeting_id=?", (meeting_id,))
+            meeting_data = await cur.fetchone()
+        if not meeting_data:
+            await update.message.reply_text("Meeting not found in the database. Please check your meeting ID.")
+            return
+        role = "a" if int(meeting_data[0]) == user_id else "b"
+        roles[(meeting_id, user_id)] = role
 
-    c.execute(
-        "SELECT user_a_id, user_b_id, user_a_schedule, user_b_schedule, meeting_duration FROM meetings WHERE meeting_id=?",
-        (meeting_id,)
-    )
-    meeting_data = c.fetchone()
+    # Only check whether this user's schedule is present; the ICS text itself is not needed here.
+    async with pool.read() as cur:
+        await cur.execute(f"SELECT user_{role}_schedule IS NOT NULL FROM meetings WHERE meeting_id=?", (meeting_id,))
+        meeting_data = await cur.fetchone()
     if not meeting_data:
         await update.message.reply_text("Meeting not found in the database. Please check your meeting ID.")
         return
 
-    user_a_id, user_b_id, user_a_schedule, user_b_schedule, meeting_duration = meeting_data
-
-    if int(user_a_id) == user_id:
-        if user_a_schedule is None:
-            c.execute("UPDATE meetings SET user_a_schedule=? WHERE meeting_id=?", (calendar_content, meeting_id))
-            await update.message.reply_text("Your schedule has been stored. Waiting for the other user.")
-        else:
-            await update.message.reply_text("Your schedule has already been stored. Waiting for the other user.")
+    if not meeting_data[0]:
+        parsed = await asyncio.get_running_loop().run_in_executor(
+            executor, scheduler2.parse_and_dump, calendar_content
+        )
+        async with pool.write() as cur:
+            await cur.execute(
+                f"UPDATE meetings SET user_{role}_schedule=?, user_{role}_parsed=? WHERE meeting_id=?",
+                (calendar_content, parsed, meeting_id)
+            )
+        await update.message.reply_text("Your schedule has been stored. Waiting for the other user.")
     else:
-        if user_b_schedule is None:
-            c.execute("UPDATE meetings SET user_b_schedule=? WHERE meeting_id=?", (calendar_content, meeting_id))
-            await update.message.reply_text("Your schedule has been stored. Waiting for the other user.")
-        else:
-            await update.message.reply_text("Your schedule has already been stored. Waiting for the other user.")
-
-    conn.commit()
-
-    c.execute(
-        "SELECT user_a_schedule, user_b_schedule, user_a_id, user_b_id, meeting_duration FROM meetings WHERE meeting_id=?",
-        (meeting_id,)
-    )
-    row = c.fetchone()
+        await update.message.reply_text("Your schedule has already been stored. Waiting for the other user.")
+
+    async with pool.read() as cur:
+        await cur.execute(
+            "SELECT user_a_id, user_b_id, meeting_duration, "
+            "user_a_schedule IS NOT NULL AND user_b_schedule IS NOT NULL "
+            "FROM meetings WHERE meeting_id=?",
+            (meeting_id,)
+        )
+        row = await cur.fetchone()
     if row:
-        user_a_schedule, user_b_schedule, user_a_id, user_b_id, meeting_duration = row
+        user_a_id, user_b_id, meeting_duration, both_uploaded = row
         if meeting_duration is None:
             await update.message.reply_text("Meeting duration not set. Please enter the meeting duration first.")
             return
-        if user_a_schedule and user_b_schedule:
-            await context.bot.send_message(user_a_id, "Both schedules have been uploaded. Calculating free slots...")
-            await context.bot.send_message(user_b_id, "Both schedules have been uploaded. Calculating free slots...")
-            ics_contents = [user_a_schedule, user_b_schedule]
-            common_slots = scheduler2.find_best_meeting_slots(ics_contents, meeting_duration_minutes=meeting_duration)
+        if both_uploaded:
+            await asyncio.gather(
+                context.bot.send_message(user_a_id, "Both schedules have been uploaded. Calculating free slots..."),
+                context.bot.send_message(user_b_id, "Both schedules have been uploaded. Calculating free slots..."),
+            )
+            common_slots = await common_slots_for_meeting(context, meeting_id, meeting_duration)
             if common_slots:
-                # Cache the computed common slots for this meeting.
-                context.bot_data[meeting_id] = common_slots
                 keyboard = [
                     [InlineKeyboardButton(slot, callback_data=f"{meeting_id}|{slot}")]
                     for slot in common_slots
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.bot.send_message(user_a_id, "Common free slots:", reply_markup=reply_markup)
-                await context.bot.send_message(user_b_id, "Common free slots:", reply_markup=reply_markup)
+                await asyncio.gather(
+                    context.bot.send_message(user_a_id, "Common free slots:", reply_markup=reply_markup),
+                    context.bot.send_message(user_b_id, "Common free slots:", reply_markup=reply_markup),
+                )
             else:
-                await context.bot.send_message(user_a_id, "No common free slots found.")
-                await context.bot.send_message(user_b_id, "No common free slots found.")
+                await asyncio.gather(
+                    context.bot.send_message(user_a_id, "No common free slots found."),
+                    context.bot.send_message(user_b_id, "No common free slots found."),
+                )
 
 # /join command handler for participants joining an existing meeting.
 async def join_meeting(update: Update, context: CallbackContext):
@@ -206,8 +379,9 @@ async def join_meeting(update: Update, context: CallbackContext):
         return
 
     user_id = update.message.from_user.id
-    c.execute("SELECT meeting_id, user_b_id FROM meetings WHERE meeting_id=?", (meeting_id,))
-    meeting_data = c.fetchone()
+    async with pool.read() as cur:
+        await cur.execute("SELECT meeting_id, user_b_id FROM meetings WHERE meeting_id=?", (meeting_id,))
+        meeting_data = await cur.fetchone()
     if not meeting_data:
         await update.message.reply_text("Invalid Meeting ID. Please check and try again.")
         return
@@ -217,8 +391,16 @@ async def join_meeting(update: Update, context: CallbackContext):
         await update.message.reply_text("This meeting already has a second participant.")
         return
 
-    c.execute("UPDATE meetings SET user_b_id=? WHERE meeting_id=?", (user_id, meeting_id))
-    conn.commit()
+    # Only claim the second seat if it is still free; another user may have joined since the check above.
+    async with pool.write() as cur:
+        await cur.execute(
+            "UPDATE meetings SET user_b_id=? WHERE meeting_id=? AND user_b_id IS NULL", (user_id, meeting_id)
+        )
+        joined = cur.rowcount > 0
+    if not joined:
+        await update.message.reply_text("This meeting already has a second participant.")
+        return
+    context.bot_data.setdefault("roles", {})[(meeting_id, user_id)] = "b"
     context.user_data['current_meeting'] = meeting_id
     await update.message.reply_text(f"Joined meeting {meeting_id}. Please upload your .ics file.")
 
@@ -228,20 +410,12 @@ async def slot_selection(update: Update, context: CallbackContext):
     meeting_id, chosen_slot = query.data.split("|", 1)
     user_id = query.from_user.id
 
-    # Retrieve the cached common slots (or recalc if missing)
-    common_slots = context.bot_data.get(meeting_id)
-    if not common_slots:
-        c.execute("SELECT user_a_schedule, user_b_schedule, meeting_duration FROM meetings WHERE meeting_id=?", (meeting_id,))
-        row = c.fetchone()
-        if not row:
-            await query.answer("Meeting data not found.")
-            return
-        user_a_schedule, user_b_schedule, meeting_duration = row
-        if not meeting_duration:
-            meeting_duration = 30
-        ics_contents = [user_a_schedule, user_b_schedule]
-        common_slots = scheduler2.find_best_meeting_slots(ics_contents, meeting_duration_minutes=meeting_duration)
-        context.bot_data[meeting_id] = common_slots
+    cached = await cached_slots_entry(context, meeting_id)
+    if cached is None:
+        await query.answer("Meeting data not found.")
+        return
+    common_slots = cached["slots"]
+    slot_set = cached["set"]
 
     # Ensure we have a dictionary in context.user_data for this meeting.
     if meeting_id not in context.user_data:
@@ -250,35 +424,52 @@ async def slot_selection(update: Update, context: CallbackContext):
         context.user_data[meeting_id][user_id] = set()
     selected_slots = context.user_data[meeting_id][user_id]
 
+    # Selections only ever contain offered slots, so "all selected" is a size comparison.
     # Handle the "Select All" button.
     if chosen_slot == "select_all":
-        if set(common_slots) != selected_slots:
-            context.user_data[meeting_id][user_id] = set(common_slots)
+        if len(selected_slots) != len(slot_set):
+            context.user_data[meeting_id][user_id] = set(slot_set)
         else:
             context.user_data[meeting_id][user_id].clear()
-    else:
+    elif chosen_slot in slot_set:
         # Toggle individual slot selection.
         if chosen_slot in selected_slots:
             selected_slots.remove(chosen_slot)
         else:
             selected_slots.add(chosen_slot)
 
-    # Rebuild the keyboard for each free slot.
-    keyboard = [
-        [InlineKeyboardButton(f"{'✅ ' if slot in context.user_data[meeting_id][user_id] else ''}{slot}",
-                                callback_data=f"{meeting_id}|{slot}")]
-        for slot in common_slots
-    ]
-    # Add a "Select All"/"Deselect All" button.
-    if set(common_slots) == context.user_data[meeting_id][user_id]:
-        select_all_text = "Deselect All"
+    selected_slots = context.user_data[meeting_id][user_id]
+
+    # Reuse this user's keyboard, only replacing the buttons whose state changed.
+    keyboard_key = f"{meeting_id}:keyboard"
+    cached_keyboard = context.user_data.get(keyboard_key)
+    slot_index = None
+    if cached_keyboard and cached_keyboard["slots"] is common_slots and chosen_slot != "select_all":
+        slot_index = cached["index"].get(chosen_slot)
+    if slot_index is None:
+        cached_keyboard = {
+            "slots": common_slots,
+            "rows": [[slot_button(meeting_id, slot, slot in selected_slots)] for slot in common_slots],
+            "state": None,
+            "trailer": [],
+        }
+        context.user_data[keyboard_key] = cached_keyboard
     else:
-        select_all_text = "Select All"
-    keyboard.append([InlineKeyboardButton(select_all_text, callback_data=f"{meeting_id}|select_all")])
-    # Add a "Submit" button if any slot is selected.
-    if context.user_data[meeting_id][user_id]:
-        keyboard.append([InlineKeyboardButton("Submit", callback_data=f"submit|{meeting_id}")])
-    
+        cached_keyboard["rows"][slot_index][0] = slot_button(meeting_id, chosen_slot, chosen_slot in selected_slots)
+
+    # The "Select All"/"Deselect All" and "Submit" rows only change with the overall selection state.
+    state = (len(selected_slots) == len(slot_set), bool(selected_slots))
+    if cached_keyboard["state"] != state:
+        all_selected, any_selected = state
+        select_all_text = "Deselect All" if all_selected else "Select All"
+        trailer = [[InlineKeyboardButton(select_all_text, callback_data=f"{meeting_id}|select_all")]]
+        # Add a "Submit" button if any slot is selected.
+        if any_selected:
+            trailer.append([InlineKeyboardButton("Submit", callback_data=f"submit|{meeting_id}")])
+        cached_keyboard["state"] = state
+        cached_keyboard["trailer"] = trailer
+    keyboard = cached_keyboard["rows"] + cached_keyboard["trailer"]
+
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_reply_markup(reply_markup=reply_markup)
     await query.answer()
@@ -293,32 +484,45 @@ async def submit_selection(update: Update, context: CallbackContext):
         await query.answer("No slots selected. Please select at least one slot.")
         return
 
-    c.execute(
-        "INSERT OR REPLACE INTO user_choices (meeting_id, user_id, choices) VALUES (?, ?, ?)",
-        (meeting_id, user_id, ", ".join(selected_slots))
-    )
-    conn.commit()
+    async with pool.write() as cur:
+        await cur.execute("DELETE FROM meeting_choices WHERE meeting_id=? AND user_id=?", (meeting_id, user_id))
+        await cur.executemany(
+            "INSERT INTO meeting_choices (meeting_id, user_id, slot) VALUES (?, ?, ?)",
+            [(meeting_id, user_id, slot) for slot in selected_slots]
+        )
     await query.edit_message_text("Your selections have been submitted. Please wait for the other user.")
     await query.answer("Your selections have been submitted.")
 
-    c.execute("SELECT user_id, choices FROM user_choices WHERE meeting_id=?", (meeting_id,))
-    choices = c.fetchall()
+    async with pool.read() as cur:
+        await cur.execute("SELECT DISTINCT user_id FROM meeting_choices WHERE meeting_id=?", (meeting_id,))
+        choices = await cur.fetchall()
+        both_chosen = []
+        if len(choices) == 2:
+            # Slots picked by both users.
+            await cur.execute(
+                "SELECT slot FROM meeting_choices WHERE meeting_id=? GROUP BY slot HAVING COUNT(*)=2",
+                (meeting_id,)
+            )
+            both_chosen = [row[0] for row in await cur.fetchall()]
     if len(choices) == 2:
-        user_a_choices = choices[0][1].split(", ") if choices[0][1] else []
-        user_b_choices = choices[1][1].split(", ") if choices[1][1] else []
-        common_slots_set = set(user_a_choices).intersection(user_b_choices)
-        if common_slots_set:
-            common_slot = common_slots_set.pop()
+        if both_chosen:
+            # Prefer the best-ranked slot if the meeting's slot list is cached, else the earliest.
+            cached = context.bot_data.get(meeting_id)
+            rank = cached["index"] if cached else {}
+            common_slot = min(both_chosen, key=lambda slot: (rank.get(slot, len(rank)), slot))
             user_id_a = choices[0][0]
             user_id_b = choices[1][0]
-            await context.bot.send_message(user_id_a, f"Common slot found: {common_slot}. Adding it to your calendar.")
-            await context.bot.send_message(user_id_b, f"Common slot found: {common_slot}. Adding it to your calendar.")
-            start_time, end_time = update_schedule_2.parse_selected_time(common_slot)
-            c.execute(
-                "SELECT user_a_schedule, user_b_schedule, user_a_id, user_b_id FROM meetings WHERE meeting_id=?",
-                (meeting_id,)
+            await asyncio.gather(
+                context.bot.send_message(user_id_a, f"Common slot found: {common_slot}. Adding it to your calendar."),
+                context.bot.send_message(user_id_b, f"Common slot found: {common_slot}. Adding it to your calendar."),
             )
-            row = c.fetchone()
+            start_time, end_time = update_schedule_2.parse_selected_time(common_slot)
+            async with pool.read() as cur:
+                await cur.execute(
+                    "SELECT user_a_schedule, user_b_schedule, user_a_id, user_b_id FROM meetings WHERE meeting_id=?",
+                    (meeting_id,)
+                )
+                row = await cur.fetchone()
             if row:
                 user_a_schedule, user_b_schedule, user_a_id, user_b_id = row
                 updated_ics_contents = update_schedule_2.add_event_to_ics_contents(
@@ -327,21 +531,37 @@ async def submit_selection(update: Update, context: CallbackContext):
                     end_time,
                     meeting_id
                 )
+                sends = []
                 for uid, ics_content in zip([user_a_id, user_b_id], updated_ics_contents):
                     file_obj = io.BytesIO(ics_content.encode())
                     file_obj.name = "updated_schedule.ics"
-                    await context.bot.send_document(uid, document=file_obj, caption="Here is your updated schedule.")
+                    sends.append(context.bot.send_document(uid, document=file_obj, caption="Here is your updated schedule."))
+                await asyncio.gather(*sends)
             else:
-                await context.bot.send_message(user_id_a, "Error retrieving meeting schedules.")
-                await context.bot.send_message(user_id_b, "Error retrieving meeting schedules.")
+                await asyncio.gather(
+                    context.bot.send_message(user_id_a, "Error retrieving meeting schedules."),
+                    context.bot.send_message(user_id_b, "Error retrieving meeting schedules."),
+                )
         else:
             user_id_a = choices[0][0]
             user_id_b = choices[1][0]
-            await context.bot.send_message(user_id_a, "No common slots found. Please choose again.")
-            await context.bot.send_message(user_id_b, "No common slots found. Please choose again.")
+            await asyncio.gather(
+                context.bot.send_message(user_id_a, "No common slots found. Please choose again."),
+                context.bot.send_message(user_id_b, "No common slots found. Please choose again."),
+            )
 
     context.user_data.pop('current_meeting', None)
 
+# Shared OpenAI client so its HTTP connection pool is reused across /summarise calls.
+# Created on first use so the bot can start without an OpenAI key configured.
+openai_client = None
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return openai_client
+
 # /summarise command handler.
 async def summarise_text(update: Update, context: CallbackContext):
     input_text = " ".join(context.args).strip()
@@ -351,13 +571,7 @@ async def summarise_text(update: Update, context: CallbackContext):
 
     await update.message.reply_text("Summarising your text, please wait...")
     try:
-
-
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),  
-        )
-
-        response = client.chat.completions.create(
+        response = await get_openai_client().chat.completions.create(
             messages=[
                 {"role": "system","content": "You are a medical assistant in charge of summarising medical wound operative notes. Output one of the following classifications: clean/clean-contaminated/contaminated/dirty",},
                 {"role":"user", "content": f"Please summarise the following note:\n\n{input_text} "}
@@ -373,7 +587,13 @@ async def summarise_text(update: Update, context: CallbackContext):
         await update.message.reply_text("An error occurred while trying to summarise the text.")
 
 def main():
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(init_database)
+        .post_shutdown(close_resources)
+        .build()
+    )
 
     application.add_handler(CommandHandler("newmeeting", start_new_meeting))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
@@ -1,68 +1,148 @@
 #!/usr/bin/env python3
-from ics import Calendar
-from datetime import datetime, date, time, timedelta
+import hashlib
+import heapq
+import pickle
+from collections import OrderedDict
+import numpy as np
+from icalendar import Calendar
+from datetime import datetime, date, time, timedelta, timezone
 
-def load_calendar_from_content(ics_content):
-    """Load a calendar from ICS content (string) and return its events."""
-    calendar = Calendar(ics_content)
-    return list(calendar.events)
-
-def events_for_day(events, day, tzinfo):
-    """Return event intervals for a given day (clipped to working hours)."""
-    work_start = datetime.combine(day, time(9, 0, tzinfo=tzinfo))
-    work_end = datetime.combine(day, time(17, 0, tzinfo=tzinfo))
-    day_events = []
-    for event in events:
-        # Convert event times to the common timezone.
-        event_start = event.begin.astimezone(tzinfo)
-        event_end   = event.end.astimezone(tzinfo)
-        if event_end > work_start and event_start < work_end:
-            start = max(event_start, work_start)
-            end = min(event_end, work_end)
-            day_events.append((start, end))
-    # Merge overlapping events.
-    day_events.sort(key=lambda x: x[0])
-    merged = []
-    for interval in day_events:
-        if not merged:
-            merged.append(interval)
+# A parsed calendar is (starts, ends, first_day): two int64 arrays of UTC epoch nanoseconds plus
+# the earliest event date in the event's own timezone (None for an empty calendar). The date is
+# kept separately because the UTC arrays no longer know which timezone each event was in.
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Parsed events keyed by a digest of the ICS text, so large calendars are not kept alive as keys.
+_CALENDAR_CACHE_SIZE = 256
+_calendar_cache = OrderedDict()
+
+def _as_aware_datetime(value):
+    """Convert an ICS date/datetime value to a timezone-aware datetime (floating times are UTC)."""
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time(0, 0, tzinfo=timezone.utc))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def to_ns(dt):
+    """Convert a timezone-aware datetime to UTC epoch nanoseconds."""
+    return (dt - EPOCH) // timedelta(microseconds=1) * 1000
+
+def from_ns(ns, tzinfo):
+    """Convert UTC epoch nanoseconds to a datetime in the given timezone."""
+    return (EPOCH + timedelta(microseconds=int(ns) // 1000)).astimezone(tzinfo)
+
+def _event_arrays(starts, ends):
+    """Build read-only (starts, ends) int64 arrays, safe to share from the cache."""
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    starts.flags.writeable = False
+    ends.flags.writeable = False
+    return starts, ends
+
+def calendar_digest(ics_content):
+    """Return a short digest identifying the given ICS content."""
+    return hashlib.blake2b(ics_content.encode(), digest_size=16).digest()
+
+def _parse_calendar(ics_content):
+    """Parse ICS content (string) into (starts, ends, first_day); see the note at the top."""
+    calendar = Calendar.from_ical(ics_content)
+    starts = []
+    ends = []
+    first_day = None
+    for vevent in calendar.walk('VEVENT'):
+        if 'DTSTART' not in vevent:
+            continue
+        dtstart = vevent['DTSTART'].dt
+        if 'DTEND' in vevent:
+            dtend = vevent['DTEND'].dt
+        elif 'DURATION' in vevent:
+            dtend = dtstart + vevent['DURATION'].dt
+        elif isinstance(dtstart, datetime):
+            dtend = dtstart
         else:
-            last_start, last_end = merged[-1]
-            current_start, current_end = interval
-            if current_start <= last_end:
-                merged[-1] = (last_start, max(last_end, current_end))
-            else:
-                merged.append(interval)
-    return merged
-
-def free_intervals_for_day(events, day, tzinfo, current_dt=None):
-    """Return free intervals (as tuples of datetime) for a given day."""
-    work_start = datetime.combine(day, time(9, 0, tzinfo=tzinfo))
-    work_end = datetime.combine(day, time(17, 0, tzinfo=tzinfo))
-    busy = events_for_day(events, day, tzinfo)
-    
-    free = []
-    if not busy:
-        free.append((work_start, work_end))
-    else:
-        if work_start < busy[0][0]:
-            free.append((work_start, busy[0][0]))
-        for i in range(len(busy)-1):
-            if busy[i][1] < busy[i+1][0]:
-                free.append((busy[i][1], busy[i+1][0]))
-        if busy[-1][1] < work_end:
-            free.append((busy[-1][1], work_end))
-    
-    if current_dt and day == current_dt.date():
-        new_free = []
-        for start, end in free:
-            if current_dt > start:
-                start = max(start, current_dt)
-            if start < end:
-                new_free.append((start, end))
-        free = new_free
-
-    return free
+            # All-day event without an end lasts the whole day.
+            dtend = dtstart + timedelta(days=1)
+        begin = _as_aware_datetime(dtstart)
+        if first_day is None or begin.date() < first_day:
+            first_day = begin.date()
+        starts.append(to_ns(begin))
+        ends.append(to_ns(_as_aware_datetime(dtend)))
+    return _event_arrays(starts, ends) + (first_day,)
+
+def load_calendar_from_content(ics_content):
+    """Load a calendar from ICS content (string) and return its events, reusing earlier parses."""
+    key = calendar_digest(ics_content)
+    events = _calendar_cache.get(key)
+    if events is not None:
+        _calendar_cache.move_to_end(key)
+        return events
+    events = _parse_calendar(ics_content)
+    _calendar_cache[key] = events
+    if len(_calendar_cache) > _CALENDAR_CACHE_SIZE:
+        _calendar_cache.popitem(last=False)
+    return events
+
+def dump_events(events):
+    """Serialise parsed events to bytes for storage alongside the raw ICS."""
+    starts, ends, first_day = events
+    return pickle.dumps((np.asarray(starts), np.asarray(ends), first_day))
+
+def parse_and_dump(ics_content):
+    """Parse ICS content and return it serialised with dump_events (picklable for worker processes).
+
+    Skips the parse cache: the result is persisted, so a worker would never read the entry again.
+    """
+    return dump_events(_parse_calendar(ics_content))
+
+def load_events(blob):
+    """Rebuild parsed events from bytes produced by dump_events."""
+    starts, ends, first_day = pickle.loads(blob)
+    return _event_arrays(starts, ends) + (first_day,)
+
+def work_window_ns(day, tzinfo):
+    """Return the working hours (9:00-17:00) of a day as UTC epoch nanoseconds."""
+    work_start = to_ns(datetime.combine(day, time(9, 0, tzinfo=tzinfo)))
+    work_end = to_ns(datetime.combine(day, time(17, 0, tzinfo=tzinfo)))
+    return work_start, work_end
+
+def events_for_day(events, work_start, work_end):
+    """Return merged busy intervals (as start/end ns arrays) clipped to the given working window."""
+    starts, ends = events
+    mask = (ends > work_start) & (starts < work_end)
+    day_starts = np.maximum(starts[mask], work_start)
+    day_ends = np.minimum(ends[mask], work_end)
+    if not len(day_starts):
+        return day_starts, day_ends
+    # Merge overlapping events: a new interval begins wherever a start lies past every earlier end.
+    order = np.argsort(day_starts, kind='stable')
+    day_starts = day_starts[order]
+    running_end = np.maximum.accumulate(day_ends[order])
+    new_start = np.concatenate(([True], day_starts[1:] > running_end[:-1]))
+    group_first = np.flatnonzero(new_start)
+    group_last = np.concatenate((group_first[1:] - 1, [len(day_starts) - 1]))
+    return day_starts[group_first], running_end[group_last]
+
+def free_intervals_for_day(events, work_start, work_end, tzinfo, current_ns=None, min_length_ns=0):
+    """Return free intervals (as tuples of datetime in tzinfo) within the given working window.
+
+    current_ns, if given, is the current time in epoch ns; nothing before it is free.
+    Intervals shorter than min_length_ns are dropped.
+    """
+    busy_starts, busy_ends = events_for_day(events, work_start, work_end)
+
+    # Gaps run from the end of each busy interval (or the start of the day) to the next start.
+    free_starts = np.concatenate(([work_start], busy_ends))
+    free_ends = np.concatenate((busy_starts, [work_end]))
+
+    if current_ns is not None:
+        free_starts = np.maximum(free_starts, current_ns)
+
+    keep = (free_starts < free_ends) & (free_ends - free_starts >= min_length_ns)
+    return [
+        (from_ns(start, tzinfo), from_ns(end, tzinfo))
+        for start, end in zip(free_starts[keep], free_ends[keep])
+    ]
 
 def candidate_from_interval(interval, meeting_td):
     """Return a centrally placed meeting slot within the free interval."""
@@ -91,11 +171,10 @@ def candidate_from_interval(interval, meeting_td):
     score = slack.total_seconds() / 2
     return (score, candidate_start, candidate_end)
 
-def infer_working_week(all_events):
-    """Infer the working week (Monday to Friday) from events."""
-    if all_events:
-        min_event_date = min(event.begin.date() for event in all_events)
-        monday = min_event_date - timedelta(days=min_event_date.weekday())
+def infer_working_week(first_event_date):
+    """Infer the working week (Monday to Friday) from the earliest event date."""
+    if first_event_date is not None:
+        monday = first_event_date - timedelta(days=first_event_date.weekday())
     else:
         current_dt = datetime.now().astimezone()
         monday = current_dt.date() - timedelta(days=current_dt.weekday())
@@ -103,9 +182,9 @@ def infer_working_week(all_events):
     working_week_end = monday + timedelta(days=4)
     return working_week_start, working_week_end
 
-def get_scheduling_days(all_events, current_dt):
+def get_scheduling_days(first_event_date, current_dt):
     """Return a list of scheduling days based on the working week."""
-    working_week_start, working_week_end = infer_working_week(all_events)
+    working_week_start, working_week_end = infer_working_week(first_event_date)
     if working_week_start <= current_dt.date() <= working_week_end:
         days_count = (working_week_end - current_dt.date()).days + 1
         scheduling_days = [current_dt.date() + timedelta(days=i) for i in range(days_count)]
@@ -113,30 +192,47 @@ def get_scheduling_days(all_events, current_dt):
         scheduling_days = [working_week_start + timedelta(days=i) for i in range(5)]
     return scheduling_days
 
-def find_best_meeting_slots(ics_contents, meeting_duration_minutes, max_slots=10):
-    """Find the best meeting slots by loading events from multiple ICS contents."""
-    all_events = []
-    for ics_content in ics_contents:
-        events = load_calendar_from_content(ics_content)
-        all_events.extend(events)
+def find_best_meeting_slots(ics_contents, meeting_duration_minutes, max_slots=10, parsed_events=None):
+    """Find the best meeting slots by loading events from multiple ICS contents.
+
+    If parsed_events (a list of parsed calendars, e.g. from load_events) is given,
+    ics_contents is ignored and no ICS parsing takes place.
+    """
+    if parsed_events is None:
+        parsed_events = [load_calendar_from_content(ics_content) for ics_content in ics_contents]
+    all_events = (
+        np.concatenate([starts for starts, _, _ in parsed_events] or [np.empty(0, np.int64)]),
+        np.concatenate([ends for _, ends, _ in parsed_events] or [np.empty(0, np.int64)]),
+    )
+    first_days = [first_day for _, _, first_day in parsed_events if first_day is not None]
+    first_event_date = min(first_days) if first_days else None
 
     meeting_td = timedelta(minutes=meeting_duration_minutes)
+    meeting_ns = meeting_td // timedelta(microseconds=1) * 1000
     current_dt = datetime.now().astimezone()
     tzinfo = current_dt.tzinfo
 
-    scheduling_days = get_scheduling_days(all_events, current_dt)
+    scheduling_days = get_scheduling_days(first_event_date, current_dt)
+    work_windows = [work_window_ns(day, tzinfo) for day in scheduling_days]
+    current_ns = to_ns(current_dt)
+
+    # Drop events outside the scheduling days once, rather than re-checking them for every day.
+    starts, ends = all_events
+    in_range = (ends > work_windows[0][0]) & (starts < work_windows[-1][1])
+    all_events = (starts[in_range], ends[in_range])
 
     candidate_slots = []
-    for day in scheduling_days:
-        free_intervals = free_intervals_for_day(all_events, day, tzinfo, current_dt if day == current_dt.date() else None)
+    for day, (work_start, work_end) in zip(scheduling_days, work_windows):
+        free_intervals = free_intervals_for_day(
+            all_events, work_start, work_end, tzinfo, current_ns if day == current_dt.date() else None, meeting_ns
+        )
         for interval in free_intervals:
             candidate = candidate_from_interval(interval, meeting_td)
             if candidate:
                 score, cand_start, cand_end = candidate
                 candidate_slots.append((score, cand_start, cand_end))
 
-    candidate_slots.sort(key=lambda x: x[0], reverse=True)
-    best_slots = candidate_slots[:max_slots]
+    best_slots = heapq.nlargest(max_slots, candidate_slots, key=lambda x: x[0])
 
     formatted_slots = []
     for score, start, end in best_slots:
@@ -144,6 +240,18 @@ def find_best_meeting_slots(ics_contents, meeting_duration_minutes, max_slots=10
         formatted_slots.append(slot_str)
     return formatted_slots
 
+def find_best_meeting_slots_for_stored(stored_calendars, meeting_duration_minutes, max_slots=10):
+    """Find the best meeting slots for calendars as stored by the bot.
+
+    Each entry is either a dump_events blob (bytes) or raw ICS text for rows
+    stored before parses were persisted.
+    """
+    parsed_events = [
+        load_events(calendar) if isinstance(calendar, bytes) else load_calendar_from_content(calendar)
+        for calendar in stored_calendars
+    ]
+    return find_best_meeting_slots(None, meeting_duration_minutes, max_slots, parsed_events=parsed_events)
+
 #Usage: 
 # cal_files = ["sample1.ics", "sample2.ics", "sample3.ics"]
 # meeting_duration_minutes = 30
@@ -1,9 +1,8 @@
-from ics import Calendar, Event
 from datetime import datetime, timezone, timedelta
-import pytz  # or use zoneinfo in Python 3.9+
+from zoneinfo import ZoneInfo
 
 # Define Singapore timezone (UTC+8)
-SGT = pytz.timezone("Asia/Singapore")  # or zoneinfo.ZoneInfo("Asia/Singapore") in Python 3.9+
+SGT = ZoneInfo("Asia/Singapore")
 
 
 def parse_selected_time(selected_time: str) -> tuple[datetime, datetime]:
@@ -11,30 +10,43 @@ def parse_selected_time(selected_time: str) -> tuple[datetime, datetime]:
     date_str, time_range = selected_time.split(": ")
     start_time_str, end_time_str = time_range.split("-")
     
-    # Parse the datetime and set it to Singapore timezone
-    start_time = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %H:%M").replace(tzinfo=SGT)
-    end_time = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %H:%M").replace(tzinfo=SGT)
+    # Parse the datetime and set it to Singapore timezone. The bot always emits
+    # "YYYY-MM-DD: HH:MM-HH:MM", so slice the fields directly instead of using strptime.
+    try:
+        year, month, day = int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10])
+        start_time = datetime(year, month, day, int(start_time_str[:2]), int(start_time_str[3:5]), tzinfo=SGT)
+        end_time = datetime(year, month, day, int(end_time_str[:2]), int(end_time_str[3:5]), tzinfo=SGT)
+    except ValueError:
+        start_time = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %H:%M").replace(tzinfo=SGT)
+        end_time = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %H:%M").replace(tzinfo=SGT)
     
     return start_time, end_time
 
 
+def build_vevent(start_time: datetime, end_time: datetime, meeting_id: str) -> str:
+    """Build the VEVENT text for the scheduled meeting, with times in UTC."""
+    utc_format = "%Y%m%dT%H%M%SZ"
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"UID:{meeting_id.replace(' ', '')}@bot\r\n"
+        f"DTSTAMP:{datetime.now(timezone.utc).strftime(utc_format)}\r\n"
+        f"DTSTART:{start_time.astimezone(timezone.utc).strftime(utc_format)}\r\n"
+        f"DTEND:{end_time.astimezone(timezone.utc).strftime(utc_format)}\r\n"
+        "SUMMARY:Scheduled Meeting\r\n"
+        f"DESCRIPTION:Teams Meeting ID: {meeting_id}\r\n"
+        "END:VEVENT\r\n"
+    )
+
+
 def add_event_to_ics_contents(ics_contents, start_time, end_time, meeting_id):
     """Add the common slot as an event to the ICS contents."""
+    vevent = build_vevent(start_time, end_time, meeting_id)
     updated_contents = []
     for ics_content in ics_contents:
-        calendar = Calendar(ics_content)
-        
-        # Create a new event
-        event = Event()
-        event.name = "Scheduled Meeting"
-        event.description = f"Teams Meeting ID: {meeting_id}"
-        event.begin = start_time
-        event.end = end_time
-        
-        # Add the event to the calendar
-        calendar.events.add(event)
-        
-        # Save the updated calendar as a string
-        updated_contents.append(str(calendar))
+        # Splice the event in before the closing line instead of re-serialising every event.
+        head, end_marker, tail = ics_content.rpartition("END:VCALENDAR")
+        if not end_marker:
+            raise ValueError("ICS content has no END:VCALENDAR line")
+        updated_contents.append(head + vevent + end_marker + tail)
     
     return updated_contents